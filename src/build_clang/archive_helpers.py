@@ -0,0 +1,134 @@
+import os
+import logging
+import hashlib
+import subprocess
+
+from typing import Dict, List, Optional, Tuple
+
+from build_clang.helpers import which
+
+
+ARCHIVE_EXTENSION_BY_COMPRESSION: Dict[str, str] = {
+    # Uses pigz if available, and gzip otherwise.
+    'gzip': '.tar.gz',
+    # Same as gzip, but fails if pigz is not available.
+    'pigz': '.tar.gz',
+    'zstd': '.tar.zst',
+    # Faster to create, but larger. Most of the installation directory consists of binaries that
+    # gzip compresses poorly anyway.
+    'none': '.tar',
+}
+
+DEFAULT_COMPRESSION = 'gzip'
+
+# Compression levels accepted by each compression tool. zstd levels 20-22 would also require the
+# --ultra flag, so they are not allowed.
+COMPRESSION_LEVEL_RANGE_BY_COMPRESSION: Dict[str, Tuple[int, int]] = {
+    'gzip': (1, 9),
+    'pigz': (1, 9),
+    'zstd': (1, 19),
+}
+
+# Size of the chunks we read from the compressor's output.
+ARCHIVE_READ_CHUNK_SIZE = 1024 * 1024
+
+
+def get_pigz_cmd_line(pigz_path: str) -> List[str]:
+    return [pigz_path, '-p', str(os.cpu_count() or 1), '-c']
+
+
+def get_gzip_cmd_line() -> List[str]:
+    """
+    Returns a command line for compressing stdin to stdout in the gzip format. Uses pigz (parallel
+    gzip) if it is available, and falls back to the single-threaded gzip otherwise.
+    """
+    pigz_path = which('pigz')
+    if pigz_path:
+        return get_pigz_cmd_line(pigz_path)
+    logging.info("pigz not found, falling back to single-threaded gzip")
+    return ['gzip', '-c']
+
+
+def get_compress_cmd_line(
+        compression: str, compression_level: Optional[int]) -> Optional[List[str]]:
+    """
+    Returns a command line for compressing stdin to stdout using the given compression type, or
+    None if no compression is needed. If the compression level is not specified, the compression
+    tool's default level is used.
+    """
+    if compression == 'none':
+        return None
+    if compression == 'gzip':
+        cmd_line = get_gzip_cmd_line()
+    elif compression == 'pigz':
+        pigz_path = which('pigz')
+        if not pigz_path:
+            raise IOError("pigz not found, cannot use --compression=pigz")
+        cmd_line = get_pigz_cmd_line(pigz_path)
+    elif compression == 'zstd':
+        # -T0 makes zstd use as many threads as there are CPU cores.
+        cmd_line = ['zstd', '-T0', '-c']
+    else:
+        raise ValueError("Unknown compression type: %s" % compression)
+    if compression_level is not None:
+        cmd_line.append('-%d' % compression_level)
+    return cmd_line
+
+
+def get_archive_name(dir_basename: str, compression: str) -> str:
+    return dir_basename + ARCHIVE_EXTENSION_BY_COMPRESSION[compression]
+
+
+def create_tar_archive(
+        parent_dir: str,
+        dir_basename: str,
+        archive_path: str,
+        compression: str,
+        compression_level: Optional[int]) -> str:
+    """
+    Creates a tar archive of the given directory, compressed unless the compression is "none", and
+    returns the SHA256 checksum of the archive. The checksum is computed as the data is being
+    written, so the archive does not have to be read back from disk.
+    """
+    cmd_lines = [['tar', '-cf', '-', dir_basename]]
+    compress_cmd_line = get_compress_cmd_line(compression, compression_level)
+    if compress_cmd_line is not None:
+        cmd_lines.append(compress_cmd_line)
+    logging.info(
+        "Creating archive %s: %s (in directory: %s)",
+        archive_path, ' | '.join(' '.join(cmd_line) for cmd_line in cmd_lines), parent_dir)
+
+    sha256_hash = hashlib.sha256()
+    processes: List[subprocess.Popen] = []
+    for cmd_line in cmd_lines:
+        prev_stdout = processes[-1].stdout if processes else None
+        processes.append(subprocess.Popen(
+            cmd_line,
+            cwd=parent_dir,
+            stdin=prev_stdout,
+            stdout=subprocess.PIPE))
+        if prev_stdout is not None:
+            # Allow the previous command to receive SIGPIPE if the next one exits early.
+            prev_stdout.close()
+    output_stream = processes[-1].stdout
+    assert output_stream is not None
+
+    # Only move the archive into place once all commands have succeeded, so that a failed run does
+    # not leave a truncated archive that looks newer than the installation directory.
+    tmp_archive_path = archive_path + '.tmp'
+    try:
+        with open(tmp_archive_path, 'wb') as archive_file:
+            for chunk in iter(lambda: output_stream.read(ARCHIVE_READ_CHUNK_SIZE), b''):
+                archive_file.write(chunk)
+                sha256_hash.update(chunk)
+
+        for cmd_line, process in reversed(list(zip(cmd_lines, processes))):
+            exit_code = process.wait()
+            if exit_code != 0:
+                raise IOError("Command %s exited with code %d" % (cmd_line, exit_code))
+    except BaseException:
+        if os.path.exists(tmp_archive_path):
+            os.remove(tmp_archive_path)
+        raise
+    os.replace(tmp_archive_path, archive_path)
+    return sha256_hash.hexdigest()
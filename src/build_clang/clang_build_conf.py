@@ -39,6 +39,9 @@ class ClangBuildConf:
     # Whether to use our custom compiler wrapper script instead of the real compiler.
     use_compiler_wrapper: bool
 
+    # Whether to use ccache as the compiler launcher.
+    use_ccache: bool
+
     lto: bool
 
     unix_timestamp_for_suffix: Optional[str]
@@ -47,6 +50,9 @@ class ClangBuildConf:
 
     parallelism: Optional[int]
 
+    # Maximum number of concurrent link jobs for the LTO stage.
+    link_parallelism: Optional[int]
+
     target_arch: str
 
     openmp_enabled: bool
@@ -59,9 +65,11 @@ class ClangBuildConf:
             skip_auto_suffix: bool,
             clean_build: bool,
             use_compiler_wrapper: bool,
+            use_ccache: bool,
             use_compiler_rt: bool,
             existing_build_dir: Optional[str],
             parallelism: Optional[int],
+            link_parallelism: Optional[int],
             target_arch: str,
             openmp_enabled: bool) -> None:
         self.install_parent_dir = install_parent_dir
@@ -77,6 +85,7 @@ class ClangBuildConf:
         self.clean_build = clean_build
         self.build_start_timestamp_str = get_current_timestamp_str()
         self.use_compiler_wrapper = use_compiler_wrapper
+        self.use_ccache = use_ccache
         self.use_compiler_rt = use_compiler_rt
 
         self.unix_timestamp_for_suffix = None
@@ -101,6 +110,7 @@ class ClangBuildConf:
             self.unix_timestamp_for_suffix = str(int(time.time()))
 
         self.parallelism = parallelism
+        self.link_parallelism = link_parallelism
         self.target_arch = target_arch
         self.openmp_enabled = openmp_enabled
 
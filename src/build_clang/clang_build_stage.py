@@ -2,6 +2,7 @@ import os
 import platform
 import logging
 import shutil
+import hashlib
 
 from typing import Optional, List, Dict, Union, Tuple, Any
 
@@ -23,7 +24,10 @@ from build_clang.helpers import (
     ChangeDir,
     EnvVarContext,
     cmake_vars_to_args,
+    fast_copy,
 )
+from build_clang.constants import CCACHE_DIR_NAME, CCACHE_MAX_SIZE, BUILD_STAMP_FILE_NAME
+from build_clang.git_helpers import get_current_git_sha1
 from build_clang.compiler_wrapper import get_cmake_args_for_compiler_wrapper
 from build_clang.architecture import validate_build_output_arch, get_arch_switch_cmd_prefix
 
@@ -244,6 +248,10 @@ class ClangBuildStage:
             if self.lto:
                 vars.update(LLVM_ENABLE_LTO='Full')
                 vars.update(BUILD_SHARED_LIBS=False)
+                if self.build_conf.link_parallelism:
+                    # Each full LTO link job takes several GB of memory, so running as many of
+                    # them as there are compile jobs could run out of memory.
+                    vars['LLVM_PARALLEL_LINK_JOBS'] = str(self.build_conf.link_parallelism)
 
         # =========================================================================================
         # Stage 3 (non-LTO) and 4 (LTO)
@@ -263,6 +271,7 @@ class ClangBuildStage:
             )
 
         if self.build_conf.use_compiler_wrapper:
+            # The compiler wrapper invokes ccache on its own.
             vars.update(get_cmake_args_for_compiler_wrapper())
         else:
             c_compiler, cxx_compiler = self.get_compilers()
@@ -270,6 +279,11 @@ class ClangBuildStage:
                 CMAKE_C_COMPILER=c_compiler,
                 CMAKE_CXX_COMPILER=cxx_compiler
             )
+            if self.build_conf.use_ccache:
+                vars.update(
+                    CMAKE_C_COMPILER_LAUNCHER='ccache',
+                    CMAKE_CXX_COMPILER_LAUNCHER='ccache',
+                )
 
         final_vars: Dict[str, str] = {}
         for k in vars:
@@ -289,10 +303,28 @@ class ClangBuildStage:
         assert cxx_compiler is not None
         return c_compiler, cxx_compiler
 
+    def get_ccache_env_vars(self) -> Dict[str, str]:
+        """
+        Environment variables for ccache. The cache directory can be overridden by setting
+        CCACHE_DIR in the environment.
+        """
+        return dict(
+            CCACHE_DIR=os.environ.get(
+                'CCACHE_DIR', os.path.expanduser(os.path.join('~', '.cache', CCACHE_DIR_NAME))),
+            # Build directory names contain timestamps and Git SHA1s. Rewriting absolute paths
+            # under the install parent directory as relative paths allows cache hits across builds.
+            CCACHE_BASEDIR=self.build_conf.install_parent_dir,
+            CCACHE_MAXSIZE=CCACHE_MAX_SIZE,
+            CCACHE_COMPRESS='1',
+            CCACHE_COMPRESSLEVEL='3',
+        )
+
     def _run_ninja(self, args: List[str] = []) -> None:
         ninja_args: List[str] = get_arch_switch_cmd_prefix(self.build_conf.target_arch) + ['ninja']
         if self.build_conf.parallelism:
             ninja_args.append('-j%d' % self.build_conf.parallelism)
+            # Do not start new jobs while the system is already overloaded.
+            ninja_args.append('-l%d' % self.build_conf.parallelism)
         ninja_args.extend(args)
         run_cmd(ninja_args)
 
@@ -325,11 +357,46 @@ class ClangBuildStage:
         src_path = os.path.join(self.cmake_build_dir, binary_rel_path)
         dst_path = os.path.join(self.build_conf.get_final_install_dir(), binary_rel_path)
         self.log_info("Copying file %s to %s", src_path, dst_path)
-        shutil.copyfile(src_path, dst_path)
+        fast_copy(src_path, dst_path)
         make_file_executable(dst_path)
 
+    def get_build_stamp_path(self) -> str:
+        return os.path.join(self.cmake_build_dir, BUILD_STAMP_FILE_NAME)
+
+    def compute_build_stamp(self) -> str:
+        """
+        Computes a hash of everything that determines the result of building this stage: the CMake
+        variables (which include the compilers and the installation prefix) and the Git SHA1 of
+        the LLVM source code.
+        """
+        stamp_hash = hashlib.blake2b(digest_size=16)
+        stamp_hash.update(repr(sorted(self.get_llvm_cmake_variables().items())).encode('utf-8'))
+        stamp_hash.update(
+            get_current_git_sha1(self.build_conf.get_llvm_project_clone_dir()).encode('utf-8'))
+        return stamp_hash.hexdigest()
+
+    def is_up_to_date(self) -> bool:
+        """
+        Returns True if this stage has already been successfully built with the same configuration
+        and source code.
+        """
+        if self.build_conf.clean_build:
+            return False
+        stamp_path = self.get_build_stamp_path()
+        if not os.path.exists(stamp_path):
+            return False
+        # The LTO stage only copies a few binaries to the final installation directory and does
+        # not install anything into its own installation prefix.
+        if not self.lto and not os.path.isdir(self.install_prefix):
+            return False
+        with open(stamp_path) as stamp_file:
+            return stamp_file.read().strip() == self.compute_build_stamp()
+
     def build(self) -> None:
         self.stage_start_timestamp_str = get_current_timestamp_str()
+        stamp_path = self.get_build_stamp_path()
+        if os.path.exists(stamp_path):
+            os.remove(stamp_path)
         if os.path.exists(self.cmake_build_dir) and self.build_conf.clean_build:
             self.log_info("Deleting directory: %s", self.cmake_build_dir)
             rm_rf(self.cmake_build_dir)
@@ -349,6 +416,8 @@ class ClangBuildStage:
                     BUILD_CLANG_UNDERLYING_CXX_COMPILER=cxx_compiler,
                     BUILD_CLANG_COMPILER_INVOCATIONS_DIR=compiler_invocations_dir
                 )
+            if self.build_conf.use_ccache:
+                env_vars.update(self.get_ccache_env_vars())
             with EnvVarContext(**env_vars):
 
                 cmake_vars = self.get_llvm_cmake_variables()
@@ -375,6 +444,12 @@ class ClangBuildStage:
                     lto_binaries = ['clang', 'lld']
                     self.log_info("Building LTO binaries: %s", lto_binaries)
                     self._run_ninja(lto_binaries)
+                    # The LTO binaries replace the ones installed by the previous stage into the
+                    # same final installation directory, so that stage is no longer up to date.
+                    assert self.prev_stage is not None
+                    prev_stage_stamp_path = self.prev_stage.get_build_stamp_path()
+                    if os.path.exists(prev_stage_stamp_path):
+                        os.remove(prev_stage_stamp_path)
                     self.log_info("Installing LTO binaries: %s", lto_binaries)
                     for lto_binary_name in lto_binaries:
                         self.install_binary_to_final_dir(lto_binary_name)
@@ -400,6 +475,9 @@ class ClangBuildStage:
 
                 validate_build_output_arch(self.build_conf.target_arch, self.install_prefix)
 
+        with open(stamp_path, 'w') as stamp_file:
+            stamp_file.write(self.compute_build_stamp() + '\n')
+
     def check_dynamic_libraries(self) -> None:
         for root, dirs, files in os.walk(self.install_prefix):
             for file_name in files:
@@ -1,15 +1,14 @@
 import os
 import logging
-import shlex
-import subprocess
-import git
 import atexit
+import json
 import time
 import platform
 
-from typing import Any, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
 
-from sys_detection import is_linux, is_macos
+from sys_detection import is_linux
 
 from build_clang.constants import (
     NUM_NON_LTO_STAGES,
@@ -17,20 +16,98 @@ from build_clang.constants import (
     GIT_SHA1_PLACEHOLDER_STR_WITH_SEPARATORS,
     YB_LLVM_ARCHIVE_NAME_PREFIX,
     BUILD_CLANG_SCRIPTS_ROOT_PATH,
+    DEFAULT_INSTALL_PARENT_DIR,
+    GITHUB_TOKEN_PATH,
 )
 from build_clang.helpers import (
     mkdir_p,
     run_cmd,
     remove_version_suffix,
+    compute_sha256_checksum,
+    create_or_update_symlink,
+    rm_rf_in_background,
+    is_dir_tree_newer_than_file,
 )
 from build_clang.clang_build_stage import ClangBuildStage
 from build_clang.clang_build_conf import ClangBuildConf
-from build_clang.git_helpers import git_clone_tag, get_current_git_sha1, save_git_log_to_file
+from build_clang.archive_helpers import create_tar_archive, get_archive_name
+from build_clang.git_helpers import (
+    git_clone_tag,
+    get_current_git_sha1,
+    is_head_at_tag,
+    save_git_log_to_file,
+)
 from build_clang import remote_build
 from build_clang.devtoolset import activate_devtoolset
 from build_clang.cmd_line_args import parse_args
 
 
+# These do not change while the process is running.
+_IS_LINUX = is_linux()
+_MACHINE = platform.machine()
+
+# Number of threads to use for creating symlinks in the installation directory.
+SYMLINK_CREATION_MAX_WORKERS = 8
+
+
+# GitHub token read from GITHUB_TOKEN_PATH, cached for the lifetime of the process.
+_github_token_from_file: Optional[str] = None
+
+
+def get_github_token() -> Optional[str]:
+    """
+    Returns the GitHub token from the GITHUB_TOKEN environment variable, or from the
+    ~/.github-token file. The token is only passed to the commands that need it, and is not added
+    to the environment of this process.
+    """
+    global _github_token_from_file
+    github_token = os.getenv('GITHUB_TOKEN')
+    if github_token:
+        return github_token
+    if _github_token_from_file is None:
+        github_token_path = os.path.expanduser(GITHUB_TOKEN_PATH)
+        if not os.path.exists(github_token_path):
+            return None
+        logging.info("Reading GitHub token from %s", github_token_path)
+        with open(github_token_path) as github_token_file:
+            _github_token_from_file = github_token_file.read().strip()
+    return _github_token_from_file
+
+
+def get_hub_env() -> Dict[str, str]:
+    """
+    Returns the environment for running the hub command, with the GitHub token set if available.
+    """
+    hub_env = dict(os.environ)
+    github_token = get_github_token()
+    if github_token:
+        hub_env['GITHUB_TOKEN'] = github_token
+    return hub_env
+
+
+def find_existing_llvm_src_dirs(search_root: str) -> List[str]:
+    """
+    Finds directories matching <search_root>/*/<LLVM_PROJECT_CLONE_REL_PATH>, i.e. LLVM source
+    checkouts in earlier build directories. Only looks at the first level of subdirectories instead
+    of walking the whole tree.
+    """
+    result = []
+    try:
+        with os.scandir(search_root) as top_level_entries:
+            for entry in top_level_entries:
+                try:
+                    if not entry.is_dir(follow_symlinks=False):
+                        continue
+                except OSError:
+                    continue
+                candidate_path = os.path.join(entry.path, LLVM_PROJECT_CLONE_REL_PATH)
+                if os.path.isdir(candidate_path):
+                    result.append(candidate_path)
+    except (FileNotFoundError, PermissionError):
+        pass
+    return sorted(result)
+
+
 class ClangBuilder:
     args: Any
     llvm_parent_dir: str
@@ -64,43 +141,20 @@ class ClangBuilder:
         llvm_project_src_path = self.build_conf.get_llvm_project_clone_dir()
         logging.info(f"Cloning LLVM code to {llvm_project_src_path}")
 
-        find_cmd = [
-            'find', '/opt/yb-build/llvm', '-mindepth', '3', '-maxdepth', '3',
-            '-wholename', os.path.join('*', LLVM_PROJECT_CLONE_REL_PATH)
-        ]
-        logging.info("Searching for existing LLVM source directories using command: %s",
-                     ' '.join([shlex.quote(item) for item in find_cmd]))
-        existing_src_dirs = subprocess.check_output(find_cmd).decode('utf-8').split('\n')
+        logging.info("Searching for existing LLVM source directories in %s",
+                     DEFAULT_INSTALL_PARENT_DIR)
+        existing_src_dirs = find_existing_llvm_src_dirs(DEFAULT_INSTALL_PARENT_DIR)
 
         tag_we_want = 'llvmorg-%s' % self.build_conf.version
 
         existing_dir_to_use: Optional[str] = None
         llvm_repo_url = f'https://github.com/{self.args.github_org}/llvm-project.git'
         for existing_src_dir in existing_src_dirs:
-            existing_src_dir = existing_src_dir.strip()
-            if not existing_src_dir:
-                continue
-            if not os.path.exists(existing_src_dir):
-                logging.warning("Directory %s does not exist", existing_src_dir)
-                continue
-
-            repo = git.Repo(existing_src_dir)
-            # From https://stackoverflow.com/questions/34932306/get-tags-of-a-commit
-            # Also relevant:
-            # https://stackoverflow.com/questions/32523121/gitpython-get-current-tag-detached-head
-            for tag in repo.tags:
-                tag_commit = repo.commit(tag)
-                if tag_commit.hexsha == repo.head.commit.hexsha:
-                    logging.info(
-                        f"Found tag {tag.name} in {existing_src_dir} "
-                        f"matching the head SHA1 {repo.head.commit.hexsha}")
-                    if tag.name == tag_we_want:
-                        existing_dir_to_use = existing_src_dir
-                        logging.info(
-                            "This tag matches the name we want: %s, will clone from directory %s",
-                            tag_we_want, existing_dir_to_use)
-                        break
-            if existing_dir_to_use:
+            if is_head_at_tag(existing_src_dir, tag_we_want):
+                existing_dir_to_use = existing_src_dir
+                logging.info(
+                    "Found tag %s at the head commit of %s, will clone from that directory",
+                    tag_we_want, existing_dir_to_use)
                 break
         if not existing_dir_to_use:
             logging.info("Did not find an existing checkout of tag %s, will clone %s",
@@ -111,7 +165,7 @@ class ClangBuilder:
             def remove_dir_with_placeholder_in_name() -> None:
                 if os.path.exists(llvm_project_src_path):
                     logging.info("Removing directory %s", llvm_project_src_path)
-                    subprocess.call(['rm', '-rf', llvm_project_src_path])
+                    rm_rf_in_background(llvm_project_src_path)
                 else:
                     logging.warning("Directory %s does not exist, nothing to remove",
                                     llvm_project_src_path)
@@ -137,11 +191,11 @@ class ClangBuilder:
         the corresponding symlinks to satisfy this requirement.
         """
 
-        if not is_linux():
+        if not _IS_LINUX:
             return
 
         llvm_major_version = self.build_conf.llvm_major_version
-        arch = platform.machine()
+        arch = _MACHINE
 
         llvm_version_variants = sorted(set([
             str(llvm_major_version),
@@ -180,21 +234,63 @@ class ClangBuilder:
                          "This is already the expected directory.")
             return
         mkdir_p(link_parent_dir)
-        num_symlinks_created = 0
-        for file_name in os.listdir(existing_rt_lib_dir):
-            if not file_name.endswith(('.so', '.a')):
-                continue
-            actual_file_path = os.path.join(existing_rt_lib_dir, file_name)
-            name_without_ext, ext = os.path.splitext(file_name)
-            link_name = f"{name_without_ext}-{arch}{ext}"
-            link_path = os.path.join(link_parent_dir, link_name)
-            os.symlink(os.path.relpath(os.path.abspath(actual_file_path), link_parent_dir),
-                       link_path)
-            num_symlinks_created += 1
+        link_parent_dir_abs = os.path.abspath(link_parent_dir)
+        # All symlinks point to files in the same directory, so the relative path from the link
+        # directory to that directory is the same for all of them.
+        link_target_prefix = os.path.relpath(
+            os.path.abspath(existing_rt_lib_dir), link_parent_dir_abs)
+        arch_suffix_a = f'-{arch}.a'
+        arch_suffix_so = f'-{arch}.so'
+        symlinks_to_create: List[Tuple[str, str]] = []
+        with os.scandir(existing_rt_lib_dir) as rt_lib_dir_entries:
+            for entry in rt_lib_dir_entries:
+                file_name = entry.name
+                if file_name.endswith('.a'):
+                    link_name = file_name[:-2] + arch_suffix_a
+                elif file_name.endswith('.so'):
+                    link_name = file_name[:-3] + arch_suffix_so
+                else:
+                    continue
+                symlinks_to_create.append((
+                    link_target_prefix + '/' + file_name,
+                    link_parent_dir_abs + '/' + link_name))
+
+        def create_symlink(link_target_and_path: Tuple[str, str]) -> bool:
+            return create_or_update_symlink(*link_target_and_path)
+
+        with ThreadPoolExecutor(max_workers=SYMLINK_CREATION_MAX_WORKERS) as executor:
+            num_symlinks_created = sum(executor.map(create_symlink, symlinks_to_create))
 
         logging.info(
-            f"Created {num_symlinks_created} symlinks to files in {existing_rt_lib_dir} in "
-            f"{link_parent_dir} to allow Boost 1.81+ build to succeed")
+            f"Created or updated {num_symlinks_created} symlinks to files in "
+            f"{existing_rt_lib_dir} in {link_parent_dir} to allow Boost 1.81+ build to succeed")
+
+    def check_github_token(self) -> None:
+        if get_github_token() is None:
+            raise ValueError(
+                "GITHUB_TOKEN is not set and %s does not exist, but --check_github_token is "
+                "specified" % GITHUB_TOKEN_PATH)
+        logging.info("Verifying that the GitHub token works")
+        run_cmd(['hub', 'api', 'user'], cwd=BUILD_CLANG_SCRIPTS_ROOT_PATH, env=get_hub_env())
+
+    def record_stage_timing(self, stage: ClangBuildStage, elapsed_time_sec: float) -> None:
+        """
+        Appends a JSON record with the build time of the given stage to a file in the build info
+        directory, one record per line.
+        """
+        timings_path = os.path.join(self.build_conf.get_llvm_build_info_dir(), 'timings.jsonl')
+        record = dict(
+            event='stage_done',
+            stage=stage.stage_number,
+            seconds=round(elapsed_time_sec, 1),
+            lto=stage.lto,
+            git_sha1_prefix=self.build_conf.git_sha1_prefix,
+            parallelism=self.build_conf.parallelism,
+            load_avg=os.getloadavg() if hasattr(os, 'getloadavg') else None,
+        )
+        mkdir_p(os.path.dirname(timings_path))
+        with open(timings_path, 'a') as timings_file:
+            timings_file.write(json.dumps(record) + '\n')
 
     def run(self) -> None:
         if os.getenv('BUILD_CLANG_REMOTELY') == '1' and not self.args.local_build:
@@ -206,6 +302,9 @@ class ClangBuilder:
             )
             return
 
+        if self.args.check_github_token and not self.args.skip_upload:
+            self.check_github_token()
+
         activate_devtoolset()
 
         if (self.args.existing_build_dir is not None and
@@ -248,27 +347,43 @@ class ClangBuilder:
             if self.args.skip_build:
                 logging.info("Skipping building any stages, --skip_build specified")
             else:
+                # Once a stage is rebuilt, all the following stages have to be rebuilt too.
+                earlier_stage_built = False
                 for stage in self.stages:
                     if self.args.min_stage <= stage.stage_number <= effective_max_stage:
+                        if not earlier_stage_built and stage.is_up_to_date():
+                            logging.info(
+                                "Stage %d is up to date, skipping it", stage.stage_number)
+                            continue
+                        earlier_stage_built = True
                         stage_start_time_sec = time.time()
                         logging.info("Building stage %d", stage.stage_number)
                         stage.build()
                         stage_elapsed_time_sec = time.time() - stage_start_time_sec
                         logging.info("Built stage %d in %.1f seconds",
                                      stage.stage_number, stage_elapsed_time_sec)
+                        self.record_stage_timing(stage, stage_elapsed_time_sec)
                     else:
                         logging.info("Skipping stage %d", stage.stage_number)
 
+        # Packaging cannot overlap with the build: the LTO stage replaces the clang and lld
+        # binaries in the final installation directory, and the symlinks below are added to it too,
+        # so the archive can only be created once all stages are done.
         final_install_dir = (
             self.args.upload_earlier_build or self.build_conf.get_final_install_dir())
         self.create_clang_rt_builtins_symlinks(final_install_dir)
 
         final_install_dir_basename = os.path.basename(final_install_dir)
         final_install_parent_dir = os.path.dirname(final_install_dir)
-        archive_name = final_install_dir_basename + '.tar.gz'
+        archive_name = get_archive_name(final_install_dir_basename, self.args.compression)
         archive_path = os.path.join(final_install_parent_dir, archive_name)
 
-        if not self.args.reuse_tarball or not os.path.exists(archive_path):
+        if (not self.args.reuse_tarball or
+                not os.path.exists(archive_path) or
+                is_dir_tree_newer_than_file(final_install_dir, archive_path)):
+            if self.args.reuse_tarball and os.path.exists(archive_path):
+                logging.info("Not reusing archive %s, it is older than the contents of %s",
+                             archive_path, final_install_dir)
             if os.path.exists(archive_path):
                 logging.info("Removing existing archive %s", archive_path)
                 try:
@@ -276,20 +391,20 @@ class ClangBuilder:
                 except OSError as ex:
                     logging.exception("Failed to remove %s, ignoring the error", archive_path)
 
-            run_cmd(
-                ['tar', 'czf', archive_name, final_install_dir_basename],
-                cwd=final_install_parent_dir,
-            )
-
-        if is_macos():
-            sha_sum_cmd_line = ['shasum', '-a', '256']
+            archive_sha256 = create_tar_archive(
+                final_install_parent_dir,
+                final_install_dir_basename,
+                archive_path,
+                self.args.compression,
+                self.args.compression_level)
         else:
-            sha_sum_cmd_line = ['sha256sum']
-        sha_sum_cmd_line.append(archive_path)
-        sha256sum_output = subprocess.check_output(sha_sum_cmd_line).decode('utf-8')
+            logging.info("Reusing existing archive %s", archive_path)
+            archive_sha256 = compute_sha256_checksum(archive_path)
+
+        # Same format as the output of sha256sum.
         sha256sum_file_path = archive_path + '.sha256'
-        with open(sha256sum_file_path, 'w') as sha256sum_file:
-            sha256sum_file.write(sha256sum_output)
+        with open(sha256sum_file_path, 'wb') as sha256sum_file:
+            sha256sum_file.write(('%s  %s\n' % (archive_sha256, archive_name)).encode('ascii'))
 
         assert final_install_dir_basename.startswith(YB_LLVM_ARCHIVE_NAME_PREFIX)
         tag = final_install_dir_basename[len(YB_LLVM_ARCHIVE_NAME_PREFIX):]
@@ -298,12 +413,6 @@ class ClangBuilder:
             logging.info("Skipping upload")
             return
 
-        github_token_path = os.path.expanduser('~/.github-token')
-        if os.path.exists(github_token_path) and not os.getenv('GITHUB_TOKEN'):
-            logging.info("Reading GitHub token from %s", github_token_path)
-            with open(github_token_path) as github_token_file:
-                os.environ['GITHUB_TOKEN'] = github_token_file.read().strip()
-
         run_cmd([
             'hub',
             'release',
@@ -312,4 +421,4 @@ class ClangBuilder:
             '-a', archive_path,
             '-a', sha256sum_file_path,
             # '-t', ...
-        ], cwd=BUILD_CLANG_SCRIPTS_ROOT_PATH)
+        ], cwd=BUILD_CLANG_SCRIPTS_ROOT_PATH, env=get_hub_env())
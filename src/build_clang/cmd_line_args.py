@@ -13,7 +13,12 @@ from build_clang.constants import (
     LLVM_VERSION_MAP,
     NUM_NON_LTO_STAGES,
 )
-from build_clang.helpers import get_major_version
+from build_clang.helpers import get_major_version, which
+from build_clang.archive_helpers import (
+    ARCHIVE_EXTENSION_BY_COMPRESSION,
+    COMPRESSION_LEVEL_RANGE_BY_COMPRESSION,
+    DEFAULT_COMPRESSION,
+)
 from build_clang.clang_build_conf import ClangBuildConf
 
 
@@ -66,7 +71,12 @@ def create_arg_parser() -> argparse.ArgumentParser:
     parser.add_argument(
         '--use_compiler_wrapper',
         action='store_true',
-        help='Use a compiler wrapper script. May slow down compilation.')
+        help='Use a compiler wrapper script. May slow down compilation. Set '
+             'BUILD_CLANG_LOG_INVOCATIONS=1 to also log every compiler invocation.')
+    parser.add_argument(
+        '--no_ccache',
+        action='store_true',
+        help='Do not use ccache as the compiler launcher, even if it is available.')
     parser.add_argument(
         '--lto',
         action='store_true',
@@ -85,6 +95,21 @@ def create_arg_parser() -> argparse.ArgumentParser:
         '--reuse_tarball',
         help='Reuse existing tarball (for use with --upload_earlier_build).',
         action='store_true')
+    parser.add_argument(
+        '--compression',
+        help='Compression to use for the release archive. gzip uses pigz (parallel gzip) if it is '
+             'available, and pigz requires it. zstd is much faster than gzip, but the archive '
+             'will have the .tar.zst extension instead of .tar.gz. none creates an uncompressed '
+             '.tar archive. '
+             'Default: ' + DEFAULT_COMPRESSION,
+        choices=sorted(ARCHIVE_EXTENSION_BY_COMPRESSION.keys()),
+        default=DEFAULT_COMPRESSION)
+    parser.add_argument(
+        '--compression_level',
+        type=int,
+        help='Compression level for the release archive: 1-9 for gzip and pigz, 1-19 for zstd. '
+             'Not allowed with --compression=none. '
+             'Default: the default level of the compression tool.')
     parser.add_argument(
         '--no_compiler_rt',
         help='Do not use compiler-rt runtime',
@@ -97,7 +122,16 @@ def create_arg_parser() -> argparse.ArgumentParser:
     parser.add_argument(
         '--parallelism', '-j',
         type=int,
-        help='Set the parallelism level for Ninja builds'
+        default=os.cpu_count(),
+        help='Set the parallelism level for Ninja builds. Also used as the maximum load average. '
+             'Default: number of CPUs.'
+    )
+    parser.add_argument(
+        '--link_parallelism',
+        type=int,
+        help='Maximum number of concurrent link jobs in the LTO stage, where each link job needs '
+             'several GB of memory. Compilation still uses the --parallelism level. '
+             'Default: a quarter of --parallelism.'
     )
     parser.add_argument(
         '--github_org',
@@ -113,6 +147,11 @@ def create_arg_parser() -> argparse.ArgumentParser:
         '--skip_upload',
         help='Skip package upload',
         action='store_true')
+    parser.add_argument(
+        '--check_github_token',
+        help='Verify that a working GitHub token is available before starting the build, so that '
+             'the upload at the end does not fail after hours of building.',
+        action='store_true')
 
     parser.add_argument(
         '--target_arch',
@@ -147,6 +186,17 @@ def parse_args() -> Tuple[argparse.Namespace, ClangBuildConf]:
                 "--min-stage value (%d) is greater than --max-stage value (%d)" % (
                     args.min_stage, args.max_stage))
 
+    if args.compression_level is not None:
+        if args.compression not in COMPRESSION_LEVEL_RANGE_BY_COMPRESSION:
+            raise ValueError(
+                "--compression_level cannot be used with --compression=%s" % args.compression)
+        min_level, max_level = COMPRESSION_LEVEL_RANGE_BY_COMPRESSION[args.compression]
+        if not min_level <= args.compression_level <= max_level:
+            raise ValueError(
+                "--compression_level value %d is out of range for --compression=%s, must be "
+                "between %d and %d" % (
+                    args.compression_level, args.compression, min_level, max_level))
+
     if args.existing_build_dir:
         logging.info("Assuming --skip_auto_suffix because --existing_build_dir is set")
         args.skip_auto_suffix = True
@@ -189,6 +239,16 @@ def parse_args() -> Tuple[argparse.Namespace, ClangBuildConf]:
                 target_arch_from_env,
                 current_arch))
 
+    if args.link_parallelism is None and args.parallelism:
+        args.link_parallelism = max(1, args.parallelism // 4)
+
+    use_ccache = False
+    if not args.no_ccache:
+        if which('ccache'):
+            use_ccache = True
+        else:
+            logging.info("ccache not found, building without it")
+
     build_conf = ClangBuildConf(
         install_parent_dir=args.install_parent_dir,
         version=args.llvm_version,
@@ -196,9 +256,11 @@ def parse_args() -> Tuple[argparse.Namespace, ClangBuildConf]:
         skip_auto_suffix=args.skip_auto_suffix,
         clean_build=args.clean,
         use_compiler_wrapper=args.use_compiler_wrapper,
+        use_ccache=use_ccache,
         use_compiler_rt=not args.no_compiler_rt,
         existing_build_dir=args.existing_build_dir,
         parallelism=args.parallelism,
+        link_parallelism=args.link_parallelism,
         target_arch=current_arch,
         openmp_enabled=args.with_openmp
     )
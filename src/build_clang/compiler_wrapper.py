@@ -2,13 +2,17 @@
 
 import sys
 import os
-import subprocess
 import logging
 import json
-from build_clang.helpers import str_md5, get_current_timestamp_str
+from build_clang.helpers import get_current_timestamp_str
 from typing import List, Dict
 
 
+# File in BUILD_CLANG_COMPILER_INVOCATIONS_DIR where compiler invocations are logged, one JSON
+# record per line.
+COMPILER_INVOCATIONS_LOG_FILE_NAME = 'compiler_invocations.jsonl'
+
+
 class CompilerWrapper:
     is_cxx: bool
     args: List[str]
@@ -30,20 +34,32 @@ class CompilerWrapper:
         compiler_path_and_args = [underlying_compiler_path] + args
 
         logging.info("Running %s compiler: %s", language, compiler_path_and_args)
-        compiler_invocation_file_path = os.path.join(
-            os.environ['BUILD_CLANG_COMPILER_INVOCATIONS_DIR'],
-            'compiler_invocation_%s_%s.json' % (
-                get_current_timestamp_str(),
-                str_md5(' '.join(compiler_path_and_args))))
+        if os.environ.get('BUILD_CLANG_LOG_INVOCATIONS') == '1':
+            self.save_invocation(underlying_compiler_path, args)
+        # Replace this process instead of waiting for a child process.
+        os.execvp('ccache', ['ccache', 'compiler'] + args)
 
+    def save_invocation(self, underlying_compiler_path: str, args: List[str]) -> None:
+        """
+        Appends a JSON record of this invocation to a single log file shared by all compiler
+        invocations of the stage. Each record is written with a single write call to a file opened
+        in append mode, so records from concurrent compiler processes do not interleave.
+        """
+        invocations_log_path = os.path.join(
+            os.environ['BUILD_CLANG_COMPILER_INVOCATIONS_DIR'],
+            COMPILER_INVOCATIONS_LOG_FILE_NAME)
         invocation_dict = {
             'compiler': underlying_compiler_path,
             'args': args,
-            'directory': os.getcwd()
+            'directory': os.getcwd(),
+            'timestamp': get_current_timestamp_str(),
         }
-        with open(compiler_invocation_file_path, 'w') as invocation_file:
-            json.dump(invocation_dict, invocation_file, indent=2)
-        subprocess.check_call(['ccache', 'compiler'] + args)
+        record = (json.dumps(invocation_dict) + '\n').encode('utf-8')
+        fd = os.open(invocations_log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, record)
+        finally:
+            os.close(fd)
 
 
 def run_compiler_wrapper(is_cxx: bool) -> None:
@@ -1,4 +1,3 @@
-from build_clang.helpers import multiline_str_to_list
 import os
 
 
@@ -7,16 +6,16 @@ NUM_NON_LTO_STAGES = 3
 # Length of Git SHA1 prefix to be used in directory name.
 GIT_SHA1_PREFIX_LENGTH = 8
 
-DEVTOOLSET_ENV_VARS = set(multiline_str_to_list("""
-    INFOPATH
-    LD_LIBRARY_PATH
-    MANPATH
-    PATH
-    PCP_DIR
-    PERL5LIB
-    PKG_CONFIG_PATH
-    PYTHONPATH
-"""))
+DEVTOOLSET_ENV_VARS = frozenset([
+    'INFOPATH',
+    'LD_LIBRARY_PATH',
+    'MANPATH',
+    'PATH',
+    'PCP_DIR',
+    'PERL5LIB',
+    'PKG_CONFIG_PATH',
+    'PYTHONPATH',
+])
 
 YB_LLVM_ARCHIVE_NAME_PREFIX = 'yb-llvm-'
 
@@ -46,5 +45,19 @@ LLVM_VERSION_MAP = {
 
 DEFAULT_GITHUB_ORG = 'yugabyte'
 
+# File to read the GitHub token from if the GITHUB_TOKEN environment variable is not set.
+GITHUB_TOKEN_PATH = '~/.github-token'
+
+# Directory name relative to ~/.cache for data cached between runs.
+BUILD_CLANG_CACHE_DIR_NAME = 'build-clang'
+
+# ccache directory name relative to ~/.cache, used unless CCACHE_DIR is set.
+CCACHE_DIR_NAME = os.path.join(BUILD_CLANG_CACHE_DIR_NAME, 'ccache')
+CCACHE_MAX_SIZE = '100G'
+
+# File in a stage's CMake build directory that identifies the configuration and source code that
+# the stage was last successfully built with.
+BUILD_STAMP_FILE_NAME = '.build_clang_stamp'
+
 BUILD_CLANG_SCRIPTS_ROOT_PATH = os.path.dirname(os.path.dirname(os.path.dirname(
     os.path.abspath(__file__))))
@@ -1,11 +1,16 @@
 import subprocess
 import logging
 import os
+import json
+import hashlib
+
+from typing import Dict
 
 import sys_detection
 from sys_detection import is_linux
 
-from build_clang.constants import DEVTOOLSET_ENV_VARS
+from build_clang.constants import DEVTOOLSET_ENV_VARS, BUILD_CLANG_CACHE_DIR_NAME
+from build_clang.helpers import mkdir_p
 
 
 def activate_devtoolset() -> None:
@@ -21,14 +26,48 @@ def activate_devtoolset() -> None:
             break
     if not found:
         raise ValueError("Could not find an acceptable devtoolset")
+
+    # The enable script prepends to the current values of variables such as PATH, so its output
+    # depends both on the script and on those values.
+    input_env_hash = hashlib.blake2b(
+        json.dumps([(k, os.environ.get(k)) for k in sorted(DEVTOOLSET_ENV_VARS)]).encode('utf-8'),
+        digest_size=8).hexdigest()
+    cache_file_path = os.path.join(
+        os.path.expanduser(os.path.join('~', '.cache', BUILD_CLANG_CACHE_DIR_NAME)),
+        'devtoolset-%d-%d-%s.json' % (
+            devtoolset_number, os.stat(enable_script_path).st_mtime_ns, input_env_hash))
+    devtoolset_env: Dict[str, str]
+    if os.path.exists(cache_file_path):
+        logging.info("Loading devtoolset environment from %s", cache_file_path)
+        with open(cache_file_path) as cache_file:
+            devtoolset_env = json.load(cache_file)
+    else:
+        devtoolset_env = get_devtoolset_env(enable_script_path)
+        mkdir_p(os.path.dirname(cache_file_path))
+        tmp_cache_file_path = '%s.tmp.%d' % (cache_file_path, os.getpid())
+        with open(tmp_cache_file_path, 'w') as tmp_cache_file:
+            json.dump(devtoolset_env, tmp_cache_file, indent=2)
+        os.replace(tmp_cache_file_path, cache_file_path)
+
+    for k, v in sorted(devtoolset_env.items()):
+        logging.info("Setting %s to: %s", k, v)
+        os.environ[k] = v
+
+
+def get_devtoolset_env(enable_script_path: str) -> Dict[str, str]:
+    """
+    Runs the given devtoolset enable script and returns the values of the environment variables
+    that it sets and that we care about.
+    """
     devtoolset_env_str = subprocess.check_output(
         ['bash', '-c', f'. {enable_script_path} && env']).decode('utf-8')
 
+    devtoolset_env = {}
     for line in devtoolset_env_str.split("\n"):
         line = line.strip()
         if not line:
             continue
         k, v = line.split("=", 1)
         if k in DEVTOOLSET_ENV_VARS:
-            logging.info("Setting %s to: %s", k, v)
-            os.environ[k] = v
+            devtoolset_env[k] = v
+    return devtoolset_env
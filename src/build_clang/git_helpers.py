@@ -3,14 +3,21 @@ import subprocess
 import pathlib
 import logging
 import sys
+import shutil
 
-from build_clang.helpers import run_cmd, ChangeDir
+from build_clang.helpers import run_cmd, reflink_or_copy
 from typing import Optional
 
 
 CLONE_DEPTH = 10
 
 
+def reflink_or_copy_with_mode(src_path: str, dst_path: str) -> None:
+    # Keep the executable bits of files in the working tree, the same way cp -R does.
+    reflink_or_copy(src_path, dst_path)
+    shutil.copymode(src_path, dst_path)
+
+
 def git_clone_tag(
         repo_url: str,
         tag: str,
@@ -20,23 +27,21 @@ def git_clone_tag(
     if os.path.exists(dest_path):
         return
     cmd_line = ['git', 'clone', repo_url, '--branch', tag, '--depth', str(CLONE_DEPTH), dest_path]
-    p = subprocess.Popen(
-        cmd_line,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE)
-    stdout, stderr = p.communicate()
-    sys.stdout.write(stdout.decode('utf-8') + '\n')
-    sys.stderr.write(stderr.decode('utf-8') + '\n')
-    if p.returncode == 0:
+    logging.info("Running command: %s", cmd_line)
+    result = subprocess.run(cmd_line, capture_output=True)
+    if result.returncode == 0:
         return
-    if (b'attempt to fetch/clone from a shallow repository' in stderr and
+    sys.stdout.write(result.stdout.decode('utf-8') + '\n')
+    sys.stderr.write(result.stderr.decode('utf-8') + '\n')
+    if (b'attempt to fetch/clone from a shallow repository' in result.stderr and
             repo_url.startswith('/') and
             os.path.isdir(repo_url)):
         logging.info("git does not support cloning from a shallow repository, just copying")
-        subprocess.check_call(['cp', '-R', repo_url, dest_path])
+        shutil.copytree(
+            repo_url, dest_path, symlinks=True, copy_function=reflink_or_copy_with_mode)
         return
 
-    raise IOError("git command %s exited with code %d" % (cmd_line, p.returncode))
+    raise IOError("git command %s exited with code %d" % (cmd_line, result.returncode))
 
 
 def get_current_git_sha1(repo_path: str) -> str:
@@ -46,6 +51,24 @@ def get_current_git_sha1(repo_path: str) -> str:
     ).strip().decode('utf-8')
 
 
+def is_head_at_tag(repo_path: str, tag: str) -> bool:
+    """
+    Returns True if the given tag exists in the given repository and points to its HEAD commit.
+    """
+    try:
+        sha1s = [
+            subprocess.check_output(
+                ['git', 'rev-parse', '--verify', '--quiet', rev],
+                cwd=repo_path,
+                stderr=subprocess.DEVNULL
+            ).strip()
+            for rev in [f'refs/tags/{tag}^{{commit}}', 'HEAD']
+        ]
+    except subprocess.CalledProcessError:
+        return False
+    return sha1s[0] == sha1s[1]
+
+
 def save_git_log_to_file(git_repo_dir: str, dest_file_path: str) -> None:
     dest_file_path = os.path.abspath(dest_file_path)
 
@@ -2,11 +2,16 @@ import subprocess
 import logging
 import os
 import pathlib
+import errno
+import functools
 import hashlib
 import time
 import shlex
 import stat
 import platform
+import shutil
+import sys
+import traceback
 
 from sys_detection import is_macos
 
@@ -18,7 +23,8 @@ BUILD_CLANG_SCRIPTS_ROOT_PATH = os.path.dirname(os.path.dirname(os.path.dirname(
     os.path.abspath(__file__))))
 
 
-def _validate_build_clang_scripts_root_path() -> None:
+@functools.lru_cache(maxsize=None)
+def validate_build_clang_scripts_root_path() -> None:
     for sub_dir in [
         'bin',
         'src',
@@ -37,14 +43,17 @@ def normalize_cmd_arg(arg: Any) -> Any:
     return arg
 
 
-def run_cmd(args: List[Any], cwd: Optional[str] = None) -> None:
+def run_cmd(
+        args: List[Any],
+        cwd: Optional[str] = None,
+        env: Optional[Dict[str, str]] = None) -> None:
     args = [normalize_cmd_arg(arg) for arg in args]
     effective_directory = cwd or os.getcwd()
     logging.info(
         "Running command: %s (in directory: %s)",
         ' '.join([shlex.quote(arg) for arg in args]),
         effective_directory)
-    subprocess.check_call(args, cwd=effective_directory)
+    subprocess.check_call(args, cwd=effective_directory, env=env)
 
 
 # from https://stackoverflow.com/questions/431684/how-do-i-change-the-working-directory-in-python
@@ -66,24 +75,159 @@ class ChangeDir:
         os.chdir(self.saved_path)
 
 
+def create_or_update_symlink(link_target: str, link_path: str) -> bool:
+    """
+    Makes link_path a symlink pointing to link_target. Does nothing if such a symlink already
+    exists, and atomically replaces link_path if it exists and is different. Returns True if the
+    symlink was created or replaced.
+    """
+    try:
+        if os.readlink(link_path) == link_target:
+            return False
+    except FileNotFoundError:
+        os.symlink(link_target, link_path)
+        return True
+    except OSError:
+        # Not a symlink. It will be replaced below.
+        pass
+    tmp_link_path = '%s.tmp.%d' % (link_path, os.getpid())
+    os.symlink(link_target, tmp_link_path)
+    os.replace(tmp_link_path, link_path)
+    return True
+
+
+def reflink_or_copy(src_path: str, dst_path: str) -> None:
+    """
+    Copies the contents of a file using os.copy_file_range where available. The data is copied in
+    the kernel, and on filesystems such as XFS and Btrfs it is shared between the files (reflink)
+    instead of being copied. Falls back to shutil.copyfile.
+    """
+    if hasattr(os, 'copy_file_range'):
+        try:
+            with open(src_path, 'rb') as src_file, open(dst_path, 'wb') as dst_file:
+                bytes_left = os.fstat(src_file.fileno()).st_size
+                while bytes_left > 0:
+                    bytes_copied = os.copy_file_range(
+                        src_file.fileno(), dst_file.fileno(), bytes_left)
+                    if bytes_copied == 0:
+                        break
+                    bytes_left -= bytes_copied
+            return
+        except OSError as ex:
+            if ex.errno not in (errno.EXDEV, errno.ENOSYS, errno.EOPNOTSUPP, errno.EINVAL):
+                raise
+    shutil.copyfile(src_path, dst_path)
+
+
+def fast_copy(src_path: str, dst_path: str) -> None:
+    """
+    Makes dst_path a copy of src_path, replacing it if it exists. Creates a hard link if both paths
+    are on the same filesystem, and copies the file with reflink_or_copy otherwise. With a hard
+    link, the two paths share the file mode.
+    """
+    if os.path.lexists(dst_path):
+        os.remove(dst_path)
+    try:
+        os.link(src_path, dst_path)
+        return
+    except OSError:
+        pass
+    reflink_or_copy(src_path, dst_path)
+
+
 def mkdir_p(dir_path: str) -> None:
     pathlib.Path(dir_path).mkdir(parents=True, exist_ok=True)
 
 
 def rm_rf(dir_path: str) -> None:
-    if os.path.exists(dir_path):
-        subprocess.check_call(['rm', '-rf', dir_path])
+    if os.path.islink(dir_path) or os.path.isfile(dir_path):
+        os.remove(dir_path)
+    elif os.path.exists(dir_path):
+        shutil.rmtree(dir_path)
 
 
-_validate_build_clang_scripts_root_path()
+def rm_rf_in_background(dir_path: str) -> None:
+    """
+    Renames the given directory out of the way and removes it in a detached child process, so
+    that the caller does not have to wait for a large tree to be deleted. Removes the directory in
+    the current process if it cannot be renamed.
+    """
+    trash_path = '%s.trash.%d' % (dir_path, os.getpid())
+    try:
+        os.rename(dir_path, trash_path)
+    except OSError:
+        shutil.rmtree(dir_path, ignore_errors=True)
+        return
+    # Errors in the child process are written to this file, which is only kept if the removal
+    # fails.
+    error_log_path = trash_path + '.log'
+    child_pid = os.fork()
+    if child_pid != 0:
+        logging.info("Removing %s (renamed from %s) in background process %d, errors will be "
+                     "written to %s", trash_path, dir_path, child_pid, error_log_path)
+        return
+    # This is the child process. This function is called from an atexit handler, so only use code
+    # that still works while the interpreter is shutting down (e.g. no thread pools). Always leave
+    # with os._exit so that the atexit handlers inherited from the parent do not run again here.
+    exit_code = 1
+    try:
+        os.setsid()
+        # Do not keep the parent's output pipes open, e.g. to tee in build_clang.sh, which would
+        # wait for this process to finish.
+        dev_null_fd = os.open(os.devnull, os.O_RDONLY)
+        error_log_fd = os.open(error_log_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        os.dup2(dev_null_fd, 0)
+        os.dup2(error_log_fd, 1)
+        os.dup2(error_log_fd, 2)
+        shutil.rmtree(trash_path, ignore_errors=True)
+        if os.path.exists(trash_path):
+            sys.stderr.write("Failed to remove directory %s\n" % trash_path)
+        else:
+            os.remove(error_log_path)
+            exit_code = 0
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        sys.stderr.flush()
+        os._exit(exit_code)
+
+
+def is_dir_tree_newer_than_file(dir_path: str, file_path: str) -> bool:
+    """
+    Returns True if the given directory or anything in it (not following symlinks) was modified
+    after the given file. Stops at the first such entry.
+    """
+    file_mtime = os.stat(file_path).st_mtime
+    if os.stat(dir_path).st_mtime > file_mtime:
+        return True
+    dirs_to_visit = [dir_path]
+    while dirs_to_visit:
+        with os.scandir(dirs_to_visit.pop()) as entries:
+            for entry in entries:
+                if entry.stat(follow_symlinks=False).st_mtime > file_mtime:
+                    return True
+                if entry.is_dir(follow_symlinks=False):
+                    dirs_to_visit.append(entry.path)
+    return False
+
+
+SHA256_READ_CHUNK_SIZE = 1024 * 1024
 
 
 def compute_sha256_checksum(file_path: str) -> str:
-    sha256_hash = hashlib.sha256()
     with open(file_path, "rb") as f:
-        for byte_block in iter(lambda: f.read(65536), b""):
-            sha256_hash.update(byte_block)
-    return sha256_hash.hexdigest()
+        if hasattr(hashlib, 'file_digest'):
+            # Python 3.11+: the read loop runs in C with a reused buffer.
+            return hashlib.file_digest(f, 'sha256').hexdigest()
+        else:
+            sha256_hash = hashlib.sha256()
+            buffer = memoryview(bytearray(SHA256_READ_CHUNK_SIZE))
+            while True:
+                bytes_read = f.readinto(buffer)
+                if not bytes_read:
+                    break
+                sha256_hash.update(buffer[:bytes_read])
+            return sha256_hash.hexdigest()
 
 
 def multiline_str_to_list(multiline_str: str) -> List[str]:
@@ -132,27 +276,14 @@ class EnvVarContext:
 
 
 def which(file_name: str) -> Optional[str]:
-    for path in os.environ["PATH"].split(os.pathsep):
-        full_path = os.path.join(path, file_name)
-        if os.path.exists(full_path) and os.access(full_path, os.X_OK):
-            return full_path
-    return None
-
-
-def str_md5(s: str) -> str:
-    return hashlib.md5(s.encode('utf-8')).hexdigest()
+    return shutil.which(file_name)
 
 
 def get_current_timestamp_str() -> str:
     return datetime.now().strftime('%Y-%m-%dT%H-%M-%S.%f')
 
 
-BASE36_ALPHABET = (
-    ''.join([chr(ord('0') + i) for i in range(0, 10)]) +
-    ''.join([chr(ord('a') + i) for i in range(0, 26)])
-)
-
-assert len(BASE36_ALPHABET) == 36
+BASE36_ALPHABET = '0123456789abcdefghijklmnopqrstuvwxyz'
 
 
 def base36encode(number: int) -> str:
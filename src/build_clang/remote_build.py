@@ -5,7 +5,11 @@ import sys
 
 from typing import List
 
-from build_clang.helpers import run_cmd, ChangeDir, BUILD_CLANG_SCRIPTS_ROOT_PATH
+from build_clang.helpers import (
+    run_cmd,
+    BUILD_CLANG_SCRIPTS_ROOT_PATH,
+    validate_build_clang_scripts_root_path,
+)
 
 
 def build_remotely(
@@ -15,6 +19,7 @@ def build_remotely(
     assert remote_server is not None
     assert remote_build_scripts_path is not None
     assert remote_build_scripts_path.startswith('/')
+    validate_build_clang_scripts_root_path()
 
     def run_ssh_cmd(ssh_args: List[str]) -> None:
         run_cmd(['ssh', remote_server] + ssh_args)
@@ -24,26 +29,28 @@ def build_remotely(
     if remote_mkdir:
         run_ssh_cmd(['mkdir -p %s' % quoted_remote_path])
 
-    with ChangeDir(BUILD_CLANG_SCRIPTS_ROOT_PATH):
-        excluded_files_str = subprocess.check_output(
-            ['git', '-C', '.', 'ls-files', '--exclude-standard', '-oi', '--directory'])
-        assert os.path.isdir('.git')
-        excluded_files_path = os.path.join(os.getcwd(), '.git', 'ignores.tmp')
-        with open(excluded_files_path, 'wb') as excluded_files_file:
-            excluded_files_file.write(excluded_files_str)
-
-        run_cmd([
-            'rsync',
-            '-avh',
-            '--delete',
-            '--exclude', '.git',
-            '--exclude-from=%s' % excluded_files_path,
-            '.',
-            '%s:%s' % (remote_server, remote_build_scripts_path)])
-
-        remote_bash_script = 'cd %s && bin/build_clang.sh %s' % (
-            quoted_remote_path,
-            ' '.join(shlex.quote(arg) for arg in sys.argv[1:])
-        )
-        # TODO: why exactly do we need shlex.quote here?
-        run_ssh_cmd(['bash', '-c', shlex.quote(remote_bash_script.strip())])
+    excluded_files_str = subprocess.check_output(
+        ['git', '-C', '.', 'ls-files', '--exclude-standard', '-oi', '--directory'],
+        cwd=BUILD_CLANG_SCRIPTS_ROOT_PATH)
+    git_dir_path = os.path.join(BUILD_CLANG_SCRIPTS_ROOT_PATH, '.git')
+    assert os.path.isdir(git_dir_path)
+    excluded_files_path = os.path.join(git_dir_path, 'ignores.tmp')
+    with open(excluded_files_path, 'wb') as excluded_files_file:
+        excluded_files_file.write(excluded_files_str)
+
+    run_cmd([
+        'rsync',
+        '-avh',
+        '--delete',
+        '--exclude', '.git',
+        '--exclude-from=%s' % excluded_files_path,
+        '.',
+        '%s:%s' % (remote_server, remote_build_scripts_path)
+    ], cwd=BUILD_CLANG_SCRIPTS_ROOT_PATH)
+
+    remote_bash_script = 'cd %s && bin/build_clang.sh %s' % (
+        quoted_remote_path,
+        ' '.join(shlex.quote(arg) for arg in sys.argv[1:])
+    )
+    # TODO: why exactly do we need shlex.quote here?
+    run_ssh_cmd(['bash', '-c', shlex.quote(remote_bash_script.strip())])